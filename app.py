@@ -5,30 +5,60 @@ FastAPI application for handling Instagram messages with NLP
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import uvicorn
-import json
+import orjson
 import asyncio
-from typing import Dict, List
+from collections import defaultdict
+from functools import partial
+from typing import Dict, List, Optional, Set
 import logging
-from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import hmac
+import itertools
+import queue
+import time
 import os
+import weakref
+from pathlib import Path
 
 from handlers.instagram_handler import InstagramHandler
 from handlers.openai_handler import OpenAIHandler
 from handlers.session_manager import SessionManager
+from handlers.session_store import create_session_store
 from handlers.media_handler import MediaHandler
 from handlers.delay_handler import DelayHandler
+from handlers.cache_handler import create_cache
+from config_loader import load_config_file
 
 # Configure logging
+# Request handlers only enqueue records; a listener thread formats and writes them
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+)
+_log_listener = QueueListener(_log_queue, _log_stream, respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# QueueHandler pre-renders the message; the listener's formatter adds the prefix
+_log_enqueue = QueueHandler(_log_queue)
+_log_enqueue.setFormatter(logging.Formatter('%(message)s'))
+
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    handlers=[_log_enqueue]
 )
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
-app = FastAPI(title="Instagram Chatbot API", version="1.0.0")
+app = FastAPI(
+    title="Instagram Chatbot API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
 
 # Configure CORS
 app.add_middleware(
@@ -41,9 +71,10 @@ app.add_middleware(
 
 # Load configuration
 # Try to load config.json, fallback to environment variables
+CONFIG_PATH = Path("config.json")
+
 try:
-    with open('config.json', 'r') as f:
-        config = json.load(f)
+    config = load_config_file(CONFIG_PATH)
 except FileNotFoundError:
     # Production: use environment variables only
     config = {
@@ -85,15 +116,94 @@ if os.getenv('INSTAGRAM_PAGE_ID'):
 if os.getenv('WEBHOOK_VERIFY_TOKEN'):
     config['webhook']['verify_token'] = os.getenv('WEBHOOK_VERIFY_TOKEN')
 
+# Hot config values resolved once at startup
+VERIFY_TOKEN = config["webhook"]["verify_token"].encode()
+
+# Serializes config read-modify-write in the trigger/settings endpoints
+_config_lock = asyncio.Lock()
+
 # Initialize handlers
 instagram_handler = InstagramHandler(config)
 openai_handler = OpenAIHandler(config)
-session_manager = SessionManager()
+session_store = create_session_store()
+session_manager = SessionManager(store=session_store, summarizer=openai_handler.summarize)
 media_handler = MediaHandler(config)
 delay_handler = DelayHandler(config)
 
-# Task queue for handling concurrent messages
-message_tasks: Dict[str, asyncio.Task] = {}
+# In-flight background tasks; each task removes itself from the set when done
+MAX_CONCURRENT_MESSAGES = 200
+# Beyond this many queued/running tasks, new webhooks are refused so Instagram retries later
+INFLIGHT_HIGH_WATERMARK = 500
+_inflight: Set[asyncio.Task] = set()
+_message_semaphore = asyncio.Semaphore(MAX_CONCURRENT_MESSAGES)
+
+# Instagram profiles rarely change, so cache them per sender
+USER_INFO_TTL_SECONDS = 3600
+USER_INFO_MAX_ENTRIES = 10_000
+user_info_cache = create_cache(USER_INFO_TTL_SECONDS, USER_INFO_MAX_ENTRIES, prefix="ig:user:")
+_user_info_locks: Dict[str, asyncio.Lock] = {}
+# Tasks holding or queued on each sender's lock; the lock is dropped when this hits zero
+_user_info_waiters: Dict[str, int] = {}
+
+# Pending delayed sends: loop time of the latest scheduled reply per user
+# (the gap keeps timers for one user strictly ordered)
+SEND_ORDER_GAP_SECONDS = 0.05
+_send_deadlines: Dict[str, float] = {}
+# Latest delivery task per user; each delivery waits for the one before it
+_send_chains: Dict[str, asyncio.Task] = {}
+# Replies still waiting on their typing-delay timer, so load checks and shutdown see them
+_scheduled_sends: Dict[int, tuple] = {}
+_send_ids = itertools.count()
+
+# Per-user locks; entries vanish once no in-flight task holds the lock
+_user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def spawn(coro) -> asyncio.Task:
+    """
+    Run a coroutine in the background
+    Keeps a strong reference until it finishes so the task can't be garbage collected
+    """
+    task = asyncio.create_task(coro)
+    _inflight.add(task)
+    task.add_done_callback(_inflight.discard)
+    return task
+
+
+def user_lock(user_id: str) -> asyncio.Lock:
+    """Get the lock serializing conversation updates for a user"""
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _user_locks[user_id] = lock
+    return lock
+
+
+async def read_json(request: Request) -> dict:
+    """Parse the request body with orjson (faster than Starlette's stdlib json)"""
+    return orjson.loads(await request.body())
+
+
+async def save_config():
+    """Persist config to disk without blocking the event loop"""
+    data = orjson.dumps(config, option=orjson.OPT_INDENT_2)
+    await asyncio.to_thread(CONFIG_PATH.write_bytes, data)
+
+
+@app.on_event("startup")
+async def startup():
+    """Start background session persistence (when a store is configured)"""
+    session_manager.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Deliver pending replies, flush session writes and release pooled connections"""
+    await flush_scheduled_sends()
+    await session_manager.close()
+    if session_store is not None:
+        await session_store.close()
+    await instagram_handler.close()
 
 
 @app.get("/")
@@ -102,10 +212,31 @@ async def root():
     return {
         "status": "online",
         "service": "Instagram Chatbot",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": time.time()
     }
 
 
+def active_task_count() -> int:
+    """Background tasks in flight plus replies still waiting on their delay timer"""
+    return len(_inflight) + len(_scheduled_sends)
+
+
+def is_saturated() -> bool:
+    """Whether in-flight message work has reached the high watermark"""
+    return active_task_count() >= INFLIGHT_HIGH_WATERMARK
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: 503 while saturated so load balancers stop routing here"""
+    if is_saturated():
+        return ORJSONResponse(
+            {"status": "busy", "active_tasks": active_task_count()},
+            status_code=503
+        )
+    return {"status": "ready", "active_tasks": active_task_count()}
+
+
 @app.get("/webhook")
 async def verify_webhook(request: Request):
     """
@@ -118,9 +249,18 @@ async def verify_webhook(request: Request):
     token = params.get("hub.verify_token")
     challenge = params.get("hub.challenge")
     
-    if mode == "subscribe" and token == config["webhook"]["verify_token"]:
+    token_bytes = token.encode() if token else b""
+    
+    # Constant-time comparison so the token can't be guessed via response timing
+    if mode == "subscribe" and hmac.compare_digest(token_bytes, VERIFY_TOKEN):
+        try:
+            challenge_value = int(challenge)
+        except (TypeError, ValueError):
+            logger.warning("Webhook verification sent an invalid challenge")
+            raise HTTPException(status_code=400, detail="Invalid challenge")
+        
         logger.info("Webhook verified successfully")
-        return int(challenge)
+        return challenge_value
     else:
         logger.warning("Webhook verification failed")
         raise HTTPException(status_code=403, detail="Verification failed")
@@ -132,29 +272,39 @@ async def handle_webhook(request: Request):
     Main webhook endpoint to receive Instagram messages
     Processes incoming messages asynchronously
     """
+    if is_saturated():
+        logger.warning("Webhook rejected: %d tasks in flight", active_task_count())
+        return ORJSONResponse({"status": "busy"}, status_code=503)
+    
     try:
-        body = await request.json()
-        logger.info(f"Received webhook: {json.dumps(body, indent=2)}")
+        body = await read_json(request)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Received webhook: %s", orjson.dumps(body).decode())
         
         # Process webhook in background to respond quickly
-        asyncio.create_task(process_webhook(body))
+        spawn(process_webhook(body))
         
-        return JSONResponse({"status": "received"}, status_code=200)
+        return ORJSONResponse({"status": "received"}, status_code=200)
     
     except Exception as e:
-        logger.error(f"Error handling webhook: {str(e)}")
-        return JSONResponse({"status": "error"}, status_code=200)
+        logger.error("Error handling webhook: %s", e)
+        return ORJSONResponse({"status": "error"}, status_code=200)
 
 
 async def process_webhook(data: dict):
     """
     Process Instagram webhook data
     Handles multiple concurrent messages efficiently
+    Messages from the same sender are coalesced into one reply
     """
     try:
         if data.get("object") != "instagram":
             return
         
+        # Group message texts by sender, preserving arrival order
+        per_sender: Dict[str, List[str]] = defaultdict(list)
+        recipients: Dict[str, str] = {}
+        
         for entry in data.get("entry", []):
             for messaging_event in entry.get("messaging", []):
                 # Extract message details
@@ -163,116 +313,198 @@ async def process_webhook(data: dict):
                 
                 if "message" in messaging_event:
                     message_data = messaging_event["message"]
-                    message_text = message_data.get("text", "")
-                    
-                    # Create task for this user if not already processing
-                    task_key = f"{sender_id}_{datetime.now().timestamp()}"
-                    
-                    # Handle message asynchronously
-                    task = asyncio.create_task(
-                        handle_user_message(sender_id, recipient_id, message_text)
-                    )
-                    message_tasks[task_key] = task
-                    
-                    # Clean up completed tasks
-                    cleanup_tasks()
+                    per_sender[sender_id].append(message_data.get("text", ""))
+                    recipients.setdefault(sender_id, recipient_id)
+        
+        for sender_id, texts in per_sender.items():
+            # Handle message asynchronously
+            spawn(handle_user_message(sender_id, recipients[sender_id], texts))
     
     except Exception as e:
-        logger.error(f"Error processing webhook: {str(e)}")
+        logger.error("Error processing webhook: %s", e)
 
 
-async def handle_user_message(sender_id: str, recipient_id: str, message_text: str):
+async def handle_user_message(sender_id: str, recipient_id: str, texts: List[str]):
     """
-    Handle individual user message with NLP and media triggers
+    Handle a sender's messages with NLP and media triggers
+    The texts get one combined reply, but each text can still fire its own media trigger
     Fetches user info for personalized responses
+    Concurrency is capped by _message_semaphore; a permit is only taken once the
+    sender's lock is held, so one chatty sender can't tie up every permit
     """
-    try:
-        logger.info(f"Processing message from {sender_id}: {message_text}")
-        
-        # Fetch user information from Instagram Graph API
-        user_info = await instagram_handler.get_user_info(sender_id)
-        logger.info(f"User info: {user_info}")
-        
-        # Update user session
-        session_manager.add_message(sender_id, "user", message_text)
-        
-        # Check for keyword triggers (media responses)
-        media_response = media_handler.check_triggers(message_text)
-        
-        if media_response:
-            # Send media (image or audio)
-            await send_media_response(sender_id, media_response)
-        
-        # Generate NLP response with user personalization
-        conversation_history = session_manager.get_context(sender_id)
-        ai_response = await openai_handler.generate_response(
-            message_text, 
-            conversation_history,
-            user_info=user_info
-        )
-        
-        # Send response with human-like delay
-        await send_text_with_delay(sender_id, ai_response)
-        
-        # Update session with bot response
-        session_manager.add_message(sender_id, "assistant", ai_response)
-    
-    except Exception as e:
-        logger.error(f"Error handling message from {sender_id}: {str(e)}")
-
+    # Serialize the session/OpenAI round trip per user to keep history ordered
+    async with user_lock(sender_id), _message_semaphore:
+        try:
+            message_text = "\n".join(text for text in texts if text)
+            logger.info("Processing message from %s: %s", sender_id, message_text)
+            
+            # Fetch user information from Instagram Graph API
+            user_info = await get_user_info_cached(sender_id)
+            logger.info("User info: %s", user_info)
+            
+            # Update user session
+            session_manager.add_message(sender_id, "user", message_text)
+            
+            # Check for keyword triggers (media responses) per message, in arrival order;
+            # a trigger matched by several of the texts is sent once
+            media_responses = []
+            for text in texts:
+                trigger = media_handler.check_triggers(text) if text else None
+                if trigger and all(trigger["name"] != seen["name"] for seen in media_responses):
+                    media_responses.append(trigger)
+            
+            # Generate NLP response with user personalization
+            conversation_history = session_manager.get_context(sender_id)
+            ai_response = await openai_handler.generate_response(
+                message_text, 
+                conversation_history,
+                user_info=user_info
+            )
+            
+            # Send response (and any triggered media) with human-like delay
+            await send_text_with_delay(sender_id, ai_response, media_responses)
+            
+            # Update session with bot response
+            session_manager.add_message(sender_id, "assistant", ai_response)
+
+        except Exception as e:
+            logger.error("Error handling message from %s: %s", sender_id, e)
+
+
+async def get_user_info_cached(sender_id: str) -> dict:
+    """
+    Fetch Instagram user info, served from cache when fresh
+    Concurrent misses for the same sender share a single Graph API call
+    """
+    user_info = await user_info_cache.get(sender_id)
+    if user_info is not None:
+        return user_info
 
-async def send_text_with_delay(recipient_id: str, text: str):
+    lock = _user_info_locks.setdefault(sender_id, asyncio.Lock())
+    _user_info_waiters[sender_id] = _user_info_waiters.get(sender_id, 0) + 1
+    try:
+        async with lock:
+            # Another task may have filled the cache while we waited
+            user_info = await user_info_cache.get(sender_id)
+            if user_info is not None:
+                return user_info
+
+            user_info = await instagram_handler.get_user_info(sender_id)
+            if user_info:
+                await user_info_cache.set(sender_id, user_info)
+            return user_info
+    finally:
+        remaining = _user_info_waiters[sender_id] - 1
+        if remaining:
+            _user_info_waiters[sender_id] = remaining
+        else:
+            del _user_info_waiters[sender_id]
+            del _user_info_locks[sender_id]
+
+
+async def send_text_with_delay(recipient_id: str, text: str, media: Optional[List[dict]] = None):
     """
     Send text message with human-like typing delay
-    Simulates realistic typing behavior
+    Shows the typing indicator now and schedules the send on the loop's timer,
+    so no task sits sleeping for the duration of the delay
+    Triggered media (images or audio) is delivered first, then the text, in one batch
     """
     try:
         # Calculate typing delay based on message length
         typing_delay = delay_handler.calculate_delay(text)
         
-        # Send typing indicator
-        await instagram_handler.send_typing_indicator(recipient_id, "on")
-        
-        # Wait for human-like delay
-        await asyncio.sleep(typing_delay)
-        
-        # Send actual message
-        await instagram_handler.send_text_message(recipient_id, text)
+        # Send typing indicator; nothing depends on its result
+        instagram_handler.send_typing_indicator_nowait(recipient_id, "on")
         
-        # Turn off typing indicator
-        await instagram_handler.send_typing_indicator(recipient_id, "off")
+        # Never schedule ahead of an earlier reply to the same user
+        loop = asyncio.get_running_loop()
+        send_at = max(
+            loop.time() + typing_delay,
+            _send_deadlines.get(recipient_id, 0.0) + SEND_ORDER_GAP_SECONDS
+        )
+        _send_deadlines[recipient_id] = send_at
+        send_id = next(_send_ids)
+        handle = loop.call_at(send_at, _start_scheduled_send, send_id, recipient_id, text, media, send_at)
+        _scheduled_sends[send_id] = (handle, recipient_id, text, media, send_at)
         
-        logger.info(f"Sent message to {recipient_id} with {typing_delay}s delay")
+        logger.info("Scheduled message to %s with %.2fs delay", recipient_id, typing_delay)
     
     except Exception as e:
-        logger.error(f"Error sending text message: {str(e)}")
+        logger.error("Error sending text message: %s", e)
 
 
-async def send_media_response(recipient_id: str, media_data: dict):
-    """
-    Send media (image or audio) to user
-    """
+def _start_scheduled_send(send_id: int, recipient_id: str, text: str, media: Optional[List[dict]], send_at: float):
+    """Timer callback: start delivering a message whose typing delay has elapsed"""
+    _scheduled_sends.pop(send_id, None)
+    if _send_deadlines.get(recipient_id) == send_at:
+        del _send_deadlines[recipient_id]
+    
+    # Chain onto the previous delivery so a short reply never overtakes a slow one
+    task = spawn(deliver_after(_send_chains.get(recipient_id), recipient_id, text, media))
+    _send_chains[recipient_id] = task
+    task.add_done_callback(partial(_end_send_chain, recipient_id))
+
+
+async def flush_scheduled_sends():
+    """Send every reply still waiting on its timer now, and wait for all deliveries"""
+    # Oldest first, so per-user chains keep their order
+    for send_id, (handle, recipient_id, text, media, send_at) in sorted(
+        _scheduled_sends.items(), key=lambda item: item[1][4]
+    ):
+        handle.cancel()
+        _start_scheduled_send(send_id, recipient_id, text, media, send_at)
+    
+    if _send_chains:
+        await asyncio.gather(*_send_chains.values(), return_exceptions=True)
+
+
+def _end_send_chain(recipient_id: str, task: asyncio.Task):
+    """Forget a finished delivery unless a newer one has been chained after it"""
+    if _send_chains.get(recipient_id) is task:
+        del _send_chains[recipient_id]
+
+
+async def deliver_after(previous: Optional[asyncio.Task], recipient_id: str, text: str, media: Optional[List[dict]] = None):
+    """Deliver a reply once the previous delivery to the same user has finished"""
+    if previous is not None:
+        await asyncio.wait((previous,))
+    await deliver_text(recipient_id, text, media)
+
+
+def media_op(recipient_id: str, media_data: dict) -> Optional[tuple]:
+    """Build an InstagramHandler.send_batch op for a triggered media response"""
+    media_type = media_data["type"]
+    media_path = media_data["path"]
+    
+    if media_type == "image":
+        return ("image", {"recipient_id": recipient_id, "image_url": media_path})
+    elif media_type == "audio":
+        return ("audio", {"recipient_id": recipient_id, "audio_url": media_path})
+    
+    logger.warning("Unsupported media type: %s", media_type)
+    return None
+
+
+async def deliver_text(recipient_id: str, text: str, media: Optional[List[dict]] = None):
+    """Send a text message (plus any triggered media) and clear the typing indicator"""
     try:
-        media_type = media_data["type"]
-        media_path = media_data["path"]
-        
-        if media_type == "image":
-            await instagram_handler.send_image(recipient_id, media_path)
-            logger.info(f"Sent image to {recipient_id}")
+        ops = []
+        for media_data in media or ():
+            op = media_op(recipient_id, media_data)
+            if op:
+                ops.append(op)
+        ops.append(("text", {"recipient_id": recipient_id, "text": text}))
+        
+        # Send media then text (in that order) while turning off the typing indicator
+        await asyncio.gather(
+            instagram_handler.send_batch(ops),
+            instagram_handler.send_typing_indicator(recipient_id, "off")
+        )
         
-        elif media_type == "audio":
-            await instagram_handler.send_audio(recipient_id, media_path)
-            logger.info(f"Sent audio to {recipient_id}")
+        logger.info("Sent message to %s", recipient_id)
     
     except Exception as e:
-        logger.error(f"Error sending media: {str(e)}")
-
-
-def cleanup_tasks():
-    """Remove completed tasks from the task dictionary"""
-    completed = [key for key, task in message_tasks.items() if task.done()]
-    for key in completed:
-        del message_tasks[key]
+        logger.error("Error sending text message: %s", e)
 
 
 @app.get("/stats")
@@ -280,7 +512,7 @@ async def get_stats():
     """Get chatbot statistics"""
     return {
         "active_sessions": session_manager.get_active_count(),
-        "active_tasks": len(message_tasks),
+        "active_tasks": active_task_count(),
         "total_conversations": session_manager.get_total_count()
     }
 
@@ -288,12 +520,13 @@ async def get_stats():
 @app.post("/test/send")
 async def test_send_message(request: Request):
     """Test endpoint to send a message (for development)"""
-    data = await request.json()
+    data = await read_json(request)
     recipient_id = data.get("recipient_id")
     message = data.get("message")
     
+    # Delivery happens after the typing delay, in the background
     await send_text_with_delay(recipient_id, message)
-    return {"status": "sent"}
+    return {"status": "scheduled"}
 
 
 @app.post("/chat")
@@ -303,7 +536,7 @@ async def chat_endpoint(request: Request):
     MVP: NLP responses + typing delays
     """
     try:
-        data = await request.json()
+        data = await read_json(request)
         user_id = data.get("user_id", "test_user")
         message_text = data.get("message", "").strip()
         user_name = data.get("user_name", None)  # Optional: user's name
@@ -311,44 +544,45 @@ async def chat_endpoint(request: Request):
         if not message_text:
             raise HTTPException(status_code=400, detail="Message is required")
         
-        logger.info(f"Chat request from {user_id}: {message_text}")
-        
-        # Update user session
-        session_manager.add_message(user_id, "user", message_text)
-        
-        # Build user info for personalized responses
-        user_info = {}
-        if user_name:
-            user_info['name'] = user_name
-        
-        # Calculate typing delay
-        conversation_history = session_manager.get_context(user_id)
-        ai_response = await openai_handler.generate_response(
-            message_text, 
-            conversation_history,
-            user_info
-        )
-        
-        typing_delay = delay_handler.calculate_delay(ai_response)
-        
-        # Update session with bot response
-        session_manager.add_message(user_id, "assistant", ai_response)
+        logger.info("Chat request from %s: %s", user_id, message_text)
+        
+        async with user_lock(user_id):
+            # Update user session
+            session_manager.add_message(user_id, "user", message_text)
+            
+            # Build user info for personalized responses
+            user_info = {}
+            if user_name:
+                user_info['name'] = user_name
+            
+            # Calculate typing delay
+            conversation_history = session_manager.get_context(user_id)
+            ai_response = await openai_handler.generate_response(
+                message_text, 
+                conversation_history,
+                user_info
+            )
+            
+            typing_delay = delay_handler.calculate_delay(ai_response)
+            
+            # Update session with bot response
+            session_manager.add_message(user_id, "assistant", ai_response)
         
         # Don't sleep here - let frontend handle the typing delay for better UX
         
-        # Prepare response
-        response_data = {
-            "response": ai_response,
-            "typing_delay": typing_delay,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        logger.info(f"Responding to {user_id} after {typing_delay}s delay")
+        logger.info("Responding to %s after %.2fs delay", user_id, typing_delay)
         
-        return JSONResponse(response_data, status_code=200)
+        return ORJSONResponse(
+            {
+                "response": ai_response,
+                "typing_delay": typing_delay,
+                "timestamp": time.time()
+            },
+            status_code=200
+        )
     
     except Exception as e:
-        logger.error(f"Error in chat endpoint: {str(e)}")
+        logger.error("Error in chat endpoint: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -365,7 +599,7 @@ async def get_triggers():
 async def add_trigger(request: Request):
     """Add a new media or voice trigger"""
     try:
-        data = await request.json()
+        data = await read_json(request)
         new_trigger = {
             "name": data.get("name"),
             "keywords": data.get("keywords", []),
@@ -376,23 +610,24 @@ async def add_trigger(request: Request):
         if not all([new_trigger["name"], new_trigger["keywords"], new_trigger["type"], new_trigger["path"]]):
             raise HTTPException(status_code=400, detail="Missing required fields")
         
-        config["media_triggers"].append(new_trigger)
-        
-        # Reload media handler with new triggers
         global media_handler
-        media_handler = MediaHandler(config)
-        
-        # Save to config file
-        try:
-            with open('config.json', 'w') as f:
-                json.dump(config, f, indent=2)
-        except:
-            pass  # In production, config is env-var based
+        async with _config_lock:
+            # Replace rather than mutate so in-flight readers keep a stable list
+            config["media_triggers"] = config["media_triggers"] + [new_trigger]
+            
+            # Reload media handler with new triggers
+            media_handler = MediaHandler(config)
+            
+            # Save to config file
+            try:
+                await save_config()
+            except OSError:
+                pass  # In production, config is env-var based
         
         return {"status": "success", "trigger": new_trigger}
     
     except Exception as e:
-        logger.error(f"Error adding trigger: {str(e)}")
+        logger.error("Error adding trigger: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -400,26 +635,26 @@ async def add_trigger(request: Request):
 async def delete_trigger(trigger_name: str):
     """Delete a trigger by name"""
     try:
-        config["media_triggers"] = [
-            t for t in config["media_triggers"] 
-            if t["name"] != trigger_name
-        ]
-        
-        # Reload media handler
         global media_handler
-        media_handler = MediaHandler(config)
-        
-        # Save to config file
-        try:
-            with open('config.json', 'w') as f:
-                json.dump(config, f, indent=2)
-        except:
-            pass
+        async with _config_lock:
+            config["media_triggers"] = [
+                t for t in config["media_triggers"] 
+                if t["name"] != trigger_name
+            ]
+            
+            # Reload media handler
+            media_handler = MediaHandler(config)
+            
+            # Save to config file
+            try:
+                await save_config()
+            except OSError:
+                pass
         
         return {"status": "success", "deleted": trigger_name}
     
     except Exception as e:
-        logger.error(f"Error deleting trigger: {str(e)}")
+        logger.error("Error deleting trigger: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -427,30 +662,33 @@ async def delete_trigger(trigger_name: str):
 async def update_delay_settings(request: Request):
     """Update typing delay settings"""
     try:
-        data = await request.json()
-        
-        if "base_seconds" in data:
-            config["typing_delay"]["base_seconds"] = float(data["base_seconds"])
-        if "per_word_seconds" in data:
-            config["typing_delay"]["per_word_seconds"] = float(data["per_word_seconds"])
-        if "max_seconds" in data:
-            config["typing_delay"]["max_seconds"] = float(data["max_seconds"])
+        data = await read_json(request)
         
-        # Reload delay handler
         global delay_handler
-        delay_handler = DelayHandler(config)
-        
-        # Save to config file
-        try:
-            with open('config.json', 'w') as f:
-                json.dump(config, f, indent=2)
-        except:
-            pass
+        async with _config_lock:
+            # Build a new settings dict so the running DelayHandler is never mutated
+            typing_delay = dict(config["typing_delay"])
+            if "base_seconds" in data:
+                typing_delay["base_seconds"] = float(data["base_seconds"])
+            if "per_word_seconds" in data:
+                typing_delay["per_word_seconds"] = float(data["per_word_seconds"])
+            if "max_seconds" in data:
+                typing_delay["max_seconds"] = float(data["max_seconds"])
+            config["typing_delay"] = typing_delay
+            
+            # Reload delay handler
+            delay_handler = DelayHandler(config)
+            
+            # Save to config file
+            try:
+                await save_config()
+            except OSError:
+                pass
         
         return {"status": "success", "typing_delay": config["typing_delay"]}
     
     except Exception as e:
-        logger.error(f"Error updating delay settings: {str(e)}")
+        logger.error("Error updating delay settings: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -458,7 +696,10 @@ if __name__ == "__main__":
     uvicorn.run(
         "app:app",
         host="0.0.0.0",
-        port=8000,
-        reload=True,
+        port=int(os.getenv("PORT", 8000)),
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WORKERS", 1)),
+        reload=os.getenv("DEV") == "1",
         log_level="info"
     )
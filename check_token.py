@@ -1,80 +1,88 @@
 import asyncio
-import aiohttp
-import json
+import sys
+import orjson
+from typing import List
+
+from config_loader import load_config_file, mask_token
+from handlers.instagram_handler import create_graph_session
 
 async def check_token_permissions():
     """Check token permissions and info"""
     
-    # Load config
-    with open('config.json', 'r') as f:
-        config = json.load(f)
-    
-    access_token = config['instagram']['access_token']
-    api_version = config['instagram']['api_version']
-    
-    print("=" * 80)
-    print("CHECKING ACCESS TOKEN PERMISSIONS")
-    print("=" * 80)
-    print(f"Access Token: {access_token[:30]}...{access_token[-20:]}")
-    print()
-    
-    async with aiohttp.ClientSession() as session:
-        # Debug token to see permissions
-        print("Fetching token information...")
-        url = f'https://graph.facebook.com/{api_version}/debug_token'
-        params = {
-            'input_token': access_token,
-            'access_token': access_token
-        }
+    # Output is buffered and written once, in the finally block
+    lines: List[str] = []
+    try:
+        # Load config
+        config = load_config_file()
         
-        async with session.get(url, params=params) as resp:
-            print(f"Status Code: {resp.status}")
-            result = await resp.json()
+        access_token = config['instagram']['access_token']
+        api_version = config['instagram']['api_version']
+        
+        lines.append("=" * 80)
+        lines.append("CHECKING ACCESS TOKEN PERMISSIONS")
+        lines.append("=" * 80)
+        lines.append(f"Access Token: {mask_token(access_token, head=30)}")
+        lines.append("")
+        
+        async with create_graph_session() as session:
+            # Debug token to see permissions
+            lines.append("Fetching token information...")
+            url = f'https://graph.facebook.com/{api_version}/debug_token'
+            params = {
+                'input_token': access_token,
+                'access_token': access_token
+            }
             
-            if resp.status == 200 and 'data' in result:
-                data = result['data']
-                print("\n✅ Token Information:")
-                print(f"  App ID: {data.get('app_id', 'N/A')}")
-                print(f"  Type: {data.get('type', 'N/A')}")
-                print(f"  Valid: {data.get('is_valid', False)}")
-                print(f"  Expires: {data.get('expires_at', 'Never')}")
-                print(f"  User ID: {data.get('user_id', 'N/A')}")
+            async with session.get(url, params=params) as resp:
+                lines.append(f"Status Code: {resp.status}")
+                result = await resp.json(loads=orjson.loads)
                 
-                if 'scopes' in data:
-                    print(f"\n  Permissions (Scopes):")
-                    for scope in data['scopes']:
-                        print(f"    • {scope}")
+                if resp.status == 200 and 'data' in result:
+                    data = result['data']
+                    lines.append("\n✅ Token Information:")
+                    lines.append(f"  App ID: {data.get('app_id', 'N/A')}")
+                    lines.append(f"  Type: {data.get('type', 'N/A')}")
+                    lines.append(f"  Valid: {data.get('is_valid', False)}")
+                    lines.append(f"  Expires: {data.get('expires_at', 'Never')}")
+                    lines.append(f"  User ID: {data.get('user_id', 'N/A')}")
+                    
+                    if 'scopes' in data:
+                        lines.append(f"\n  Permissions (Scopes):")
+                        for scope in data['scopes']:
+                            lines.append(f"    • {scope}")
+                    else:
+                        lines.append("\n  ⚠️ No scopes/permissions found")
                 else:
-                    print("\n  ⚠️ No scopes/permissions found")
-            else:
-                print(f"\n❌ Failed to debug token:")
-                print(json.dumps(result, indent=2))
-        
-        print("\n" + "-" * 80)
-        
-        # Try to get basic user info
-        print("\nFetching user information...")
-        url = f'https://graph.facebook.com/{api_version}/me'
-        params = {
-            'fields': 'id,name',
-            'access_token': access_token
-        }
+                    lines.append(f"\n❌ Failed to debug token:")
+                    lines.append(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
+            
+            lines.append("\n" + "-" * 80)
+            
+            # Try to get basic user info
+            lines.append("\nFetching user information...")
+            url = f'https://graph.facebook.com/{api_version}/me'
+            params = {
+                'fields': 'id,name',
+                'access_token': access_token
+            }
+            
+            async with session.get(url, params=params) as resp:
+                result = await resp.json(loads=orjson.loads)
+                if resp.status == 200:
+                    lines.append(f"✅ User: {result.get('name')} (ID: {result.get('id')})")
+                else:
+                    lines.append(f"❌ Error: {result.get('error', {}).get('message', 'Unknown error')}")
         
-        async with session.get(url, params=params) as resp:
-            result = await resp.json()
-            if resp.status == 200:
-                print(f"✅ User: {result.get('name')} (ID: {result.get('id')})")
-            else:
-                print(f"❌ Error: {result.get('error', {}).get('message', 'Unknown error')}")
-    
-    print("\n" + "=" * 80)
-    print("\nREQUIRED PERMISSIONS for Instagram Messaging:")
-    print("  • pages_read_engagement")
-    print("  • pages_messaging")
-    print("  • instagram_basic")
-    print("  • instagram_manage_messages")
-    print("\nMake sure to generate token from Graph API Explorer with these permissions.")
-    print("=" * 80)
+        lines.append("\n" + "=" * 80)
+        lines.append("\nREQUIRED PERMISSIONS for Instagram Messaging:")
+        lines.append("  • pages_read_engagement")
+        lines.append("  • pages_messaging")
+        lines.append("  • instagram_basic")
+        lines.append("  • instagram_manage_messages")
+        lines.append("\nMake sure to generate token from Graph API Explorer with these permissions.")
+        lines.append("=" * 80)
+    finally:
+        sys.stdout.write("\n".join(lines) + "\n")
 
 if __name__ == "__main__":
     asyncio.run(check_token_permissions())
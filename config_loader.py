@@ -4,8 +4,50 @@ Use this if you want to load from environment variables instead of config.json
 """
 
 import os
+from functools import lru_cache
+from pathlib import Path
 from typing import Dict
 
+import orjson
+
+REQUIRED_FIELDS = [
+    ("instagram", "access_token"),
+    ("openai", "api_key"),
+    ("webhook", "verify_token")
+]
+
+# (path, mtime_ns, size) of the last file read, and its raw bytes
+_config_file_cache: Dict = {}
+
+
+def load_config_file(path: str = "config.json") -> Dict:
+    """
+    Load config.json, reading the file only when it changes on disk
+    Each call returns a freshly parsed dict, so callers may modify it
+    without altering what later calls see
+    Raises FileNotFoundError if the file does not exist
+    """
+    stat = os.stat(path)
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    
+    if _config_file_cache.get("key") != key:
+        _config_file_cache["raw"] = Path(path).read_bytes()
+        _config_file_cache["key"] = key
+    
+    return orjson.loads(_config_file_cache["raw"])
+
+
+@lru_cache(maxsize=8)
+def mask_token(token: str, head: int = 20, tail: int = 20) -> str:
+    """
+    Redacted form of a secret for printing, e.g. 'EAAB...xyz'
+    Kept out of the config dict so it is never written back to config.json
+    """
+    if len(token) <= head + tail:
+        return "*" * len(token)
+    return f"{token[:head]}...{token[-tail:]}"
+
+
 def load_config() -> Dict:
     """
     Load configuration from environment variables
@@ -37,6 +79,7 @@ def load_config() -> Dict:
             "max_seconds": float(os.getenv("TYPING_MAX_SECONDS", "5.0")),
             "randomness_factor": float(os.getenv("TYPING_RANDOMNESS", "0.3"))
         },
+        "media_triggers": [],
         "session": {
             "timeout_minutes": int(os.getenv("SESSION_TIMEOUT_MINUTES", "30")),
             "max_messages_per_session": int(os.getenv("SESSION_MAX_MESSAGES", "20"))
@@ -46,6 +89,18 @@ def load_config() -> Dict:
     # Load media triggers from JSON file or environment
     # For simplicity, media triggers should be in config.json
     
+    # Fill blank required values from config.json when it exists
+    try:
+        file_config = load_config_file()
+    except FileNotFoundError:
+        file_config = None
+    
+    if file_config:
+        for section, field in REQUIRED_FIELDS:
+            if not config[section][field]:
+                config[section][field] = file_config.get(section, {}).get(field, "")
+        config["media_triggers"] = file_config.get("media_triggers", [])
+    
     return config
 
 
@@ -53,13 +108,7 @@ def validate_config(config: Dict) -> bool:
     """
     Validate that required configuration values are present
     """
-    required_fields = [
-        ("instagram", "access_token"),
-        ("openai", "api_key"),
-        ("webhook", "verify_token")
-    ]
-    
-    for section, field in required_fields:
+    for section, field in REQUIRED_FIELDS:
         if not config.get(section, {}).get(field):
             print(f"ERROR: Missing required config: {section}.{field}")
             return False
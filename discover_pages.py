@@ -1,99 +1,136 @@
 import asyncio
-import aiohttp
-import json
+import sys
+import orjson
+from typing import List
 
-async def discover_pages():
-    """Discover all accessible pages with current access token"""
+from config_loader import load_config_file, mask_token
+from handlers.instagram_handler import create_graph_session
+
+# Cap on concurrent Graph API requests while fanning out over pages
+MAX_CONCURRENT_REQUESTS = 32
+
+async def _fetch_page_ig(session, sem, page, token, api_version):
+    """
+    Look up a page's linked Instagram Business Account and its details
+    Returns {ok, ig_id, detail}; ok is False when the page lookup itself failed
+    """
+    page_id = page.get('id')
+    
+    ig_url = f'https://graph.facebook.com/{api_version}/{page_id}'
+    ig_params = {
+        'fields': 'instagram_business_account',
+        'access_token': token
+    }
     
-    # Load config
-    with open('config.json', 'r') as f:
-        config = json.load(f)
+    async with sem:
+        async with session.get(ig_url, params=ig_params) as ig_resp:
+            if ig_resp.status != 200:
+                return {'ok': False, 'ig_id': None, 'detail': None}
+            ig_result = await ig_resp.json(loads=orjson.loads)
     
-    access_token = config['instagram']['access_token']
-    api_version = config['instagram']['api_version']
+    if 'instagram_business_account' not in ig_result:
+        return {'ok': True, 'ig_id': None, 'detail': None}
     
-    print("=" * 80)
-    print("DISCOVERING ACCESSIBLE PAGES")
-    print("=" * 80)
-    print(f"API Version: {api_version}")
-    print(f"Access Token: {access_token[:30]}...{access_token[-20:]}")
-    print()
+    ig_id = ig_result['instagram_business_account']['id']
     
-    async with aiohttp.ClientSession() as session:
-        # Get user's pages
-        print("Fetching accessible pages...")
-        url = f'https://graph.facebook.com/{api_version}/me/accounts'
-        params = {
-            'access_token': access_token
-        }
+    # Get Instagram account details
+    ig_detail_url = f'https://graph.facebook.com/{api_version}/{ig_id}'
+    ig_detail_params = {
+        'fields': 'username,name,followers_count',
+        'access_token': token
+    }
+    
+    detail = None
+    async with sem:
+        async with session.get(ig_detail_url, params=ig_detail_params) as detail_resp:
+            if detail_resp.status == 200:
+                detail = await detail_resp.json(loads=orjson.loads)
+    
+    return {'ok': True, 'ig_id': ig_id, 'detail': detail}
+
+async def discover_pages():
+    """Discover all accessible pages with current access token"""
+    
+    lines: List[str] = []
+    try:
+        # Load config
+        config = load_config_file()
+        
+        access_token = config['instagram']['access_token']
+        api_version = config['instagram']['api_version']
+        
+        lines.append("=" * 80)
+        lines.append("DISCOVERING ACCESSIBLE PAGES")
+        lines.append("=" * 80)
+        lines.append(f"API Version: {api_version}")
+        lines.append(f"Access Token: {mask_token(access_token, head=30)}")
+        lines.append("")
         
-        async with session.get(url, params=params) as resp:
-            print(f"Status Code: {resp.status}")
-            result = await resp.json()
+        async with create_graph_session() as session:
+            # Get user's pages
+            lines.append("Fetching accessible pages...")
+            url = f'https://graph.facebook.com/{api_version}/me/accounts'
+            params = {
+                'access_token': access_token
+            }
             
-            if resp.status == 200:
-                pages = result.get('data', [])
-                
-                if not pages:
-                    print("❌ No pages found. This token may not have access to any pages.")
-                    print("\nPlease ensure:")
-                    print("1. The token has 'pages_read_engagement' permission")
-                    print("2. You've granted access to your Facebook Page")
-                    return
-                
-                print(f"\n✅ Found {len(pages)} page(s):\n")
+            async with session.get(url, params=params) as resp:
+                lines.append(f"Status Code: {resp.status}")
+                result = await resp.json(loads=orjson.loads)
                 
-                for i, page in enumerate(pages, 1):
-                    print(f"Page {i}:")
-                    print(f"  ID: {page.get('id')}")
-                    print(f"  Name: {page.get('name')}")
-                    print(f"  Access Token: {page.get('access_token', 'N/A')[:30]}...")
-                    print()
+                if resp.status == 200:
+                    pages = result.get('data', [])
                     
-                    # Check if page has Instagram account
-                    page_id = page.get('id')
-                    page_token = page.get('access_token', access_token)
+                    if not pages:
+                        lines.append("❌ No pages found. This token may not have access to any pages.")
+                        lines.append("\nPlease ensure:")
+                        lines.append("1. The token has 'pages_read_engagement' permission")
+                        lines.append("2. You've granted access to your Facebook Page")
+                        return
                     
-                    ig_url = f'https://graph.facebook.com/{api_version}/{page_id}'
-                    ig_params = {
-                        'fields': 'instagram_business_account',
-                        'access_token': page_token
-                    }
+                    lines.append(f"\n✅ Found {len(pages)} page(s):\n")
                     
-                    async with session.get(ig_url, params=ig_params) as ig_resp:
-                        if ig_resp.status == 200:
-                            ig_result = await ig_resp.json()
-                            if 'instagram_business_account' in ig_result:
-                                ig_id = ig_result['instagram_business_account']['id']
-                                print(f"  ✅ Instagram Business Account: {ig_id}")
-                                
-                                # Get Instagram account details
-                                ig_detail_url = f'https://graph.facebook.com/{api_version}/{ig_id}'
-                                ig_detail_params = {
-                                    'fields': 'username,name,followers_count',
-                                    'access_token': page_token
-                                }
+                    # Look up every page's Instagram account concurrently, within Graph rate limits
+                    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+                    results = await asyncio.gather(*[
+                        _fetch_page_ig(session, sem, page, page.get('access_token', access_token), api_version)
+                        for page in pages
+                    ], return_exceptions=True)
+                    
+                    for i, (page, ig_info) in enumerate(zip(pages, results), 1):
+                        lines.append(f"Page {i}:")
+                        lines.append(f"  ID: {page.get('id')}")
+                        lines.append(f"  Name: {page.get('name')}")
+                        lines.append(f"  Access Token: {page.get('access_token', 'N/A')[:30]}...")
+                        lines.append("")
+                        
+                        if isinstance(ig_info, Exception):
+                            lines.append(f"  ❌ Error checking Instagram account: {ig_info}")
+                        elif ig_info['ok']:
+                            if ig_info['ig_id']:
+                                lines.append(f"  ✅ Instagram Business Account: {ig_info['ig_id']}")
                                 
-                                async with session.get(ig_detail_url, params=ig_detail_params) as detail_resp:
-                                    if detail_resp.status == 200:
-                                        detail = await detail_resp.json()
-                                        print(f"     Username: @{detail.get('username', 'N/A')}")
-                                        print(f"     Name: {detail.get('name', 'N/A')}")
-                                        print(f"     Followers: {detail.get('followers_count', 'N/A')}")
-                                        print(f"\n  📝 USE THIS PAGE ID IN CONFIG.JSON: {page_id}")
+                                detail = ig_info['detail']
+                                if detail is not None:
+                                    lines.append(f"     Username: @{detail.get('username', 'N/A')}")
+                                    lines.append(f"     Name: {detail.get('name', 'N/A')}")
+                                    lines.append(f"     Followers: {detail.get('followers_count', 'N/A')}")
+                                    lines.append(f"\n  📝 USE THIS PAGE ID IN CONFIG.JSON: {page.get('id')}")
                             else:
-                                print(f"  ⚠️  No Instagram Business Account linked")
-                        print()
-                        print("-" * 80)
-            else:
-                print(f"❌ FAILED - Error:")
-                print(json.dumps(result, indent=2))
-                print("\nThis usually means:")
-                print("1. The token doesn't have 'pages_read_engagement' permission")
-                print("2. The token is for a user account, not an app")
-    
-    print()
-    print("=" * 80)
+                                lines.append(f"  ⚠️  No Instagram Business Account linked")
+                        lines.append("")
+                        lines.append("-" * 80)
+                else:
+                    lines.append(f"❌ FAILED - Error:")
+                    lines.append(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
+                    lines.append("\nThis usually means:")
+                    lines.append("1. The token doesn't have 'pages_read_engagement' permission")
+                    lines.append("2. The token is for a user account, not an app")
+        
+        lines.append("")
+        lines.append("=" * 80)
+    finally:
+        sys.stdout.write("\n".join(lines) + "\n")
 
 if __name__ == "__main__":
     asyncio.run(discover_pages())
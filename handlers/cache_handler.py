@@ -0,0 +1,101 @@
+"""
+Cache Handler
+Small TTL caches for expensive lookups (Graph API profiles, etc.)
+"""
+
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import orjson
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis is optional; fall back to in-process caching
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    def __init__(self, ttl_seconds: float, max_entries: int = 10_000):
+        """
+        In-process LRU cache with per-entry expiry
+
+        Args:
+            ttl_seconds: Time before an entry expires
+            max_entries: Maximum entries kept before evicting the oldest
+        """
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        stored_at, value = entry
+        if time.monotonic() - stored_at >= self.ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any):
+        """Store a value and evict least-recently-used entries over the cap"""
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RedisCache:
+    def __init__(self, url: str, ttl_seconds: float, prefix: str = ""):
+        """
+        Redis-backed cache shared across workers
+
+        Args:
+            url: Redis connection URL
+            ttl_seconds: Time before an entry expires
+            prefix: Key namespace, e.g. 'ig:user:'
+        """
+        self.ttl = int(ttl_seconds)
+        self.prefix = prefix
+        self.client = aioredis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing"""
+        try:
+            raw = await self.client.get(self.prefix + key)
+        except Exception as e:
+            logger.error("Redis get failed: %s", e)
+            return None
+
+        return orjson.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any):
+        """Store a value with the configured TTL"""
+        try:
+            await self.client.set(self.prefix + key, orjson.dumps(value), ex=self.ttl)
+        except Exception as e:
+            logger.error("Redis set failed: %s", e)
+
+
+def create_cache(ttl_seconds: float, max_entries: int = 10_000, prefix: str = ""):
+    """
+    Build a cache backend
+    Uses Redis when REDIS_URL is set (multi-worker deployments), in-process otherwise
+    """
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        if aioredis is not None:
+            return RedisCache(redis_url, ttl_seconds, prefix=prefix)
+        logger.warning("REDIS_URL is set but redis is not installed; using in-process cache")
+
+    return TTLCache(ttl_seconds, max_entries=max_entries)
@@ -4,7 +4,7 @@ Simulates human-like typing delays
 """
 
 import logging
-import random
+from random import uniform as _uniform
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +13,12 @@ class DelayHandler:
     def __init__(self, config: dict):
         self.config = config
         self.delay_config = config["typing_delay"]
+        
+        # Cache settings so calculate_delay does no dict lookups per message
+        self._base = self.delay_config["base_seconds"]
+        self._per_word = self.delay_config["per_word_seconds"]
+        self._max_delay = self.delay_config["max_seconds"]
+        self._rand = self.delay_config["randomness_factor"]
     
     def calculate_delay(self, text: str, message_type: str = "text") -> float:
         """
@@ -29,33 +35,23 @@ class DelayHandler:
         if message_type in ['media', 'voice']:
             return 0.5  # Minimal delay for sending media
         
-        # Get configuration
-        base_delay = self.delay_config["base_seconds"]
-        per_word = self.delay_config["per_word_seconds"]
-        max_delay = self.delay_config["max_seconds"]
-        randomness = self.delay_config["randomness_factor"]
-        
-        # Count words
-        word_count = len(text.split())
-        
-        # Smart delay for very short messages (1-3 words)
-        if word_count <= 3:
-            # Quick responses for short messages like "Hi", "Yes", "OK"
-            calculated_delay = 0.8 + (word_count * 0.2)
-        else:
-            # Calculate base delay for longer messages
-            calculated_delay = base_delay + (word_count * per_word)
+        # Count words (space count avoids building a list)
+        word_count = 1 + text.count(' ') if text else 0
         
-        # Cap at max delay
-        calculated_delay = min(calculated_delay, max_delay)
+        # Quick responses for very short messages (1-3 words) like "Hi", "Yes", "OK";
+        # otherwise base delay plus per-word time, capped at max delay
+        calculated_delay = (
+            0.8 + word_count * 0.2 if word_count <= 3
+            else self._base + word_count * self._per_word
+        )
+        calculated_delay = calculated_delay if calculated_delay < self._max_delay else self._max_delay
         
         # Add randomness (±randomness_factor%)
-        random_factor = 1 + random.uniform(-randomness, randomness)
-        final_delay = calculated_delay * random_factor
+        final_delay = calculated_delay * (1.0 + _uniform(-self._rand, self._rand))
         
-        logger.info(f"Calculated delay: {final_delay:.2f}s for {word_count} words (type: {message_type})")
+        logger.info("Calculated delay: %.2fs for %d words (type: %s)", final_delay, word_count, message_type)
         
-        return max(0.5, final_delay)  # Minimum 0.5 seconds
+        return final_delay if final_delay > 0.5 else 0.5  # Minimum 0.5 seconds
     
     def get_pause_delay(self) -> float:
         """
@@ -64,4 +60,4 @@ class DelayHandler:
         Returns:
             Short delay in seconds
         """
-        return random.uniform(0.5, 1.5)
+        return _uniform(0.5, 1.5)
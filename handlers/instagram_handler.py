@@ -4,11 +4,94 @@ Manages communication with Instagram Graph API
 """
 
 import aiohttp
+import asyncio
+import orjson
 import logging
-from typing import Optional
+import ssl
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Optional, Set, Tuple
 
 logger = logging.getLogger(__name__)
 
+# One TLS context for every Graph API connection in the process
+_SSL_CONTEXT = ssl.create_default_context()
+
+
+def _json_serialize(obj) -> str:
+    """orjson-backed serializer for aiohttp's json= request bodies"""
+    return orjson.dumps(obj).decode()
+
+
+def create_graph_session() -> aiohttp.ClientSession:
+    """
+    Build a ClientSession tuned for graph.facebook.com
+    Pooled keep-alive connections, cached DNS and a shared TLS context
+    """
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=128,
+            limit_per_host=64,
+            keepalive_timeout=75,
+            ttl_dns_cache=300,
+            use_dns_cache=True,
+            ssl=_SSL_CONTEXT,
+            enable_cleanup_closed=True
+        ),
+        timeout=aiohttp.ClientTimeout(total=15),
+        json_serialize=_json_serialize,
+        # Graph API responses are small JSON blobs
+        read_bufsize=2**14
+    )
+
+
+@lru_cache(maxsize=2048)
+def _recipient_obj(recipient_id: str) -> dict:
+    """
+    Shared {"id": ...} recipient object for a user
+    Payloads are only serialized, never mutated, so reuse across sends is safe
+    """
+    return {"id": recipient_id}
+
+
+def _text_payload(recipient_id: str, text: str) -> dict:
+    """Send API payload for a text message"""
+    return {
+        "recipient": _recipient_obj(recipient_id),
+        "message": {"text": text}
+    }
+
+
+def _attachment_payload(recipient_id: str, media_type: str, url: str) -> dict:
+    """Send API payload for a media attachment"""
+    return {
+        "recipient": _recipient_obj(recipient_id),
+        "message": {
+            "attachment": {
+                "type": media_type,
+                "payload": {"url": url}
+            }
+        }
+    }
+
+
+def _image_payload(recipient_id: str, image_url: str) -> dict:
+    """Send API payload for an image"""
+    return _attachment_payload(recipient_id, "image", image_url)
+
+
+def _audio_payload(recipient_id: str, audio_url: str) -> dict:
+    """Send API payload for an audio clip"""
+    return _attachment_payload(recipient_id, "audio", audio_url)
+
+
+# send_batch op kind -> (payload builder, log label)
+_PAYLOAD_BUILDERS = {
+    "text": (_text_payload, "message"),
+    "image": (_image_payload, "image"),
+    "audio": (_audio_payload, "audio"),
+}
+
 
 class InstagramHandler:
     def __init__(self, config: dict):
@@ -17,6 +100,33 @@ class InstagramHandler:
         self.api_version = config["instagram"]["api_version"]
         self.base_url = f"https://graph.facebook.com/{self.api_version}"
         self.page_id = config["instagram"].get("page_id", "")
+        
+        # Request invariants, built once instead of per call
+        self._messages_url = f"{self.base_url}/me/messages"
+        self._auth_params = MappingProxyType({"access_token": self.access_token})
+        self._user_info_params = MappingProxyType({
+            "fields": "name,username,profile_pic,follower_count",
+            "access_token": self.access_token
+        })
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._background: Set[asyncio.Task] = set()
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared HTTP session, creating it on first use
+        Reusing one session keeps Graph API connections alive between calls
+        """
+        if self._session is None or self._session.closed:
+            self._session = create_graph_session()
+        return self._session
+    
+    async def close(self):
+        """Close the shared HTTP session (call on app shutdown)"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
     
     async def get_user_info(self, user_id: str) -> dict:
         """
@@ -24,137 +134,117 @@ class InstagramHandler:
         Returns: {name, username, profile_pic, follower_count}
         """
         url = f"{self.base_url}/{user_id}"
-        params = {
-            "fields": "name,username,profile_pic,follower_count",
-            "access_token": self.access_token
-        }
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.info(f"Retrieved user info for {user_id}")
-                        return data
-                    else:
-                        logger.error(f"Failed to get user info: {response.status}")
-                        return {}
+            session = await self._get_session()
+            async with session.get(url, params=self._user_info_params) as response:
+                if response.status == 200:
+                    data = await response.json(loads=orjson.loads)
+                    logger.info("Retrieved user info for %s", user_id)
+                    return data
+                else:
+                    logger.error("Failed to get user info: %s", response.status)
+                    return {}
         except Exception as e:
-            logger.error(f"Error fetching user info: {str(e)}")
+            logger.error("Error fetching user info: %s", e)
             return {}
     
-    async def send_text_message(self, recipient_id: str, text: str) -> bool:
+    async def _post_message(self, payload: dict, label: str, recipient_id: str) -> bool:
         """
-        Send a text message to a user
+        POST a message payload to the Send API
+        label names the message kind in logs ('message', 'image', 'audio')
         """
-        url = f"{self.base_url}/me/messages"
-        
-        payload = {
-            "recipient": {"id": recipient_id},
-            "message": {"text": text}
-        }
-        
-        params = {"access_token": self.access_token}
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, params=params) as response:
-                    if response.status == 200:
-                        logger.info(f"Message sent successfully to {recipient_id}")
-                        return True
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Failed to send message: {error_text}")
-                        return False
+            session = await self._get_session()
+            async with session.post(self._messages_url, json=payload, params=self._auth_params) as response:
+                if response.status == 200:
+                    logger.info("%s sent successfully to %s", label.capitalize(), recipient_id)
+                    return True
+                else:
+                    error_text = await response.text()
+                    logger.error("Failed to send %s: %s", label, error_text)
+                    return False
         
         except Exception as e:
-            logger.error(f"Error sending message: {str(e)}")
+            logger.error("Error sending %s: %s", label, e)
             return False
     
+    async def send_text_message(self, recipient_id: str, text: str) -> bool:
+        """
+        Send a text message to a user
+        """
+        return await self._post_message(_text_payload(recipient_id, text), "message", recipient_id)
+    
     async def send_image(self, recipient_id: str, image_url: str) -> bool:
         """
         Send an image to a user
         """
-        url = f"{self.base_url}/me/messages"
-        
-        payload = {
-            "recipient": {"id": recipient_id},
-            "message": {
-                "attachment": {
-                    "type": "image",
-                    "payload": {"url": image_url}
-                }
-            }
-        }
-        
-        params = {"access_token": self.access_token}
-        
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, params=params) as response:
-                    if response.status == 200:
-                        logger.info(f"Image sent successfully to {recipient_id}")
-                        return True
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Failed to send image: {error_text}")
-                        return False
-        
-        except Exception as e:
-            logger.error(f"Error sending image: {str(e)}")
-            return False
+        return await self._post_message(_image_payload(recipient_id, image_url), "image", recipient_id)
     
     async def send_audio(self, recipient_id: str, audio_url: str) -> bool:
         """
         Send an audio file to a user
         """
-        url = f"{self.base_url}/me/messages"
-        
-        payload = {
-            "recipient": {"id": recipient_id},
-            "message": {
-                "attachment": {
-                    "type": "audio",
-                    "payload": {"url": audio_url}
-                }
-            }
-        }
-        
-        params = {"access_token": self.access_token}
+        return await self._post_message(_audio_payload(recipient_id, audio_url), "audio", recipient_id)
+    
+    async def send_batch(self, ops: List[Tuple[str, dict]]) -> List[bool]:
+        """
+        Send several messages over the shared connection pool
+        Ops for the same recipient go out one after another, in list order
+        (e.g. media before its caption text); different recipients are sent concurrently
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, params=params) as response:
-                    if response.status == 200:
-                        logger.info(f"Audio sent successfully to {recipient_id}")
-                        return True
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"Failed to send audio: {error_text}")
-                        return False
+        Args:
+            ops: (kind, kwargs) pairs, e.g. ("text", {"recipient_id": ..., "text": ...}),
+                 ("image", {"recipient_id": ..., "image_url": ...}),
+                 ("audio", {"recipient_id": ..., "audio_url": ...})
         
-        except Exception as e:
-            logger.error(f"Error sending audio: {str(e)}")
-            return False
+        Returns:
+            One success flag per op, in order
+        """
+        results = [False] * len(ops)
+        by_recipient: Dict[str, List[Tuple[int, dict, str]]] = {}
+        
+        # Build every payload up front, grouped per recipient
+        for index, (kind, kwargs) in enumerate(ops):
+            entry = _PAYLOAD_BUILDERS.get(kind)
+            if entry is None:
+                logger.error("Unknown batch op: %s", kind)
+                continue
+            
+            builder, label = entry
+            payload = builder(**kwargs)
+            by_recipient.setdefault(kwargs["recipient_id"], []).append((index, payload, label))
+        
+        async def send_in_order(recipient_id: str, items: List[Tuple[int, dict, str]]):
+            for index, payload, label in items:
+                results[index] = await self._post_message(payload, label, recipient_id)
+        
+        await asyncio.gather(*(send_in_order(rid, items) for rid, items in by_recipient.items()))
+        return results
     
     async def send_typing_indicator(self, recipient_id: str, action: str) -> bool:
         """
         Send typing indicator (on/off)
         """
-        url = f"{self.base_url}/me/messages"
-        
         payload = {
-            "recipient": {"id": recipient_id},
+            "recipient": _recipient_obj(recipient_id),
             "sender_action": f"typing_{action}"
         }
         
-        params = {"access_token": self.access_token}
-        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(url, json=payload, params=params) as response:
-                    return response.status == 200
+            session = await self._get_session()
+            async with session.post(self._messages_url, json=payload, params=self._auth_params) as response:
+                return response.status == 200
         
         except Exception as e:
-            logger.error(f"Error sending typing indicator: {str(e)}")
+            logger.error("Error sending typing indicator: %s", e)
             return False
+    
+    def send_typing_indicator_nowait(self, recipient_id: str, action: str):
+        """
+        Send typing indicator (on/off) in the background
+        For callers that don't need the result, so the request overlaps other work
+        """
+        task = asyncio.create_task(self.send_typing_indicator(recipient_id, action))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
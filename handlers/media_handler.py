@@ -4,6 +4,7 @@ Handles keyword-based media triggers (images and audio)
 """
 
 import logging
+import re
 from typing import Optional, Dict
 
 logger = logging.getLogger(__name__)
@@ -13,6 +14,28 @@ class MediaHandler:
     def __init__(self, config: dict):
         self.config = config
         self.keyword_triggers = config["media_triggers"]
+        self._build_pattern()
+    
+    def _build_pattern(self):
+        """
+        Compile all trigger keywords into one case-insensitive regex
+        Each trigger gets its own capture group so a match dispatches by group index;
+        when several triggers match, check_triggers picks the lowest group (config order)
+        """
+        groups = []
+        for trigger in self.keyword_triggers:
+            keywords = sorted(
+                (re.escape(keyword) for keyword in trigger["keywords"] if keyword),
+                key=len,
+                reverse=True
+            )
+            # A group that can never match keeps group indexes aligned with triggers
+            groups.append("(" + "|".join(keywords) + ")" if keywords else "(?!)")
+        
+        self._pattern = (
+            re.compile(r"(?<!\w)(?:" + "|".join(groups) + r")(?!\w)", re.IGNORECASE)
+            if groups else None
+        )
     
     def check_triggers(self, message_text: str) -> Optional[Dict]:
         """
@@ -24,21 +47,25 @@ class MediaHandler:
         Returns:
             Dict with media type and path if triggered, None otherwise
         """
-        message_lower = message_text.lower()
+        if self._pattern is None:
+            return None
         
-        # Check each trigger
-        for trigger in self.keyword_triggers:
-            keywords = trigger["keywords"]
-            
-            # Check if any keyword matches
-            for keyword in keywords:
-                if keyword.lower() in message_lower:
-                    logger.info(f"Keyword '{keyword}' triggered: {trigger['type']}")
-                    return {
-                        "type": trigger["type"],
-                        "path": trigger["path"],
-                        "name": trigger["name"]
-                    }
+        # The first trigger in config order wins, wherever its keyword appears
+        match = None
+        for candidate in self._pattern.finditer(message_text):
+            if match is None or candidate.lastindex < match.lastindex:
+                match = candidate
+                if match.lastindex == 1:
+                    break
+        
+        if match:
+            trigger = self.keyword_triggers[match.lastindex - 1]
+            logger.info("Keyword '%s' triggered: %s", match.group(0), trigger['type'])
+            return {
+                "type": trigger["type"],
+                "path": trigger["path"],
+                "name": trigger["name"]
+            }
         
         return None
     
@@ -60,7 +87,8 @@ class MediaHandler:
         }
         
         self.keyword_triggers.append(new_trigger)
-        logger.info(f"Added new trigger: {name}")
+        self._build_pattern()
+        logger.info("Added new trigger: %s", name)
     
     def remove_trigger(self, name: str) -> bool:
         """
@@ -77,8 +105,10 @@ class MediaHandler:
             t for t in self.keyword_triggers if t["name"] != name
         ]
         
+        self._build_pattern()
+        
         removed = len(self.keyword_triggers) < original_length
         if removed:
-            logger.info(f"Removed trigger: {name}")
+            logger.info("Removed trigger: %s", name)
         
         return removed
@@ -4,11 +4,28 @@ Manages NLP responses using OpenAI GPT models
 """
 
 from openai import AsyncOpenAI
+import hashlib
 import logging
-from typing import List, Dict
+import orjson
+from typing import List, Dict, Optional
+
+from handlers.cache_handler import create_cache
 
 logger = logging.getLogger(__name__)
 
+# Identical prompts (same persona, context and message) reuse the previous reply
+RESPONSE_CACHE_TTL_SECONDS = 3600
+RESPONSE_CACHE_MAX_ENTRIES = 10_000
+
+# Running conversation summaries (see SessionManager) stay short and factual
+SUMMARY_PROMPT = (
+    "You maintain a running summary of an Instagram DM conversation. "
+    "Merge the previous summary with the new messages into a concise summary "
+    "of at most a few sentences. Keep names, preferences, questions asked and "
+    "anything promised. Reply with the summary only."
+)
+SUMMARY_MAX_TOKENS = 200
+
 
 class OpenAIHandler:
     def __init__(self, config: dict):
@@ -18,6 +35,17 @@ class OpenAIHandler:
         self.system_prompt = config["openai"]["system_prompt"]
         self.max_tokens = config["openai"]["max_tokens"]
         self.temperature = config["openai"]["temperature"]
+        self.response_cache = create_cache(
+            RESPONSE_CACHE_TTL_SECONDS,
+            RESPONSE_CACHE_MAX_ENTRIES,
+            prefix="openai:resp:"
+        )
+    
+    def _cache_key(self, messages: List[Dict[str, str]]) -> str:
+        """Hash the model and full prompt into a compact cache key"""
+        digest = hashlib.blake2b(self.model.encode(), digest_size=16)
+        digest.update(orjson.dumps(messages))
+        return digest.hexdigest()
     
     async def generate_response(
         self, 
@@ -50,13 +78,21 @@ class OpenAIHandler:
                 {"role": "system", "content": system_content}
             ]
             
-            # Add conversation history (last N messages for context)
+            # Add conversation history as given; SessionManager.get_context already
+            # bounds it (summary, not-yet-summarized messages, then the recent window)
             if conversation_history:
-                messages.extend(conversation_history[-10:])  # Last 10 messages
+                messages.extend(conversation_history)
             
             # Add current user message
             messages.append({"role": "user", "content": user_message})
             
+            # Serve repeated prompts from cache
+            cache_key = self._cache_key(messages)
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Cache hit for response: %.50s...", cached)
+                return cached
+            
             # Call OpenAI API
             response = await self.client.chat.completions.create(
                 model=self.model,
@@ -70,10 +106,39 @@ class OpenAIHandler:
             # Extract response text
             ai_message = response.choices[0].message.content.strip()
             
-            logger.info(f"Generated response: {ai_message[:50]}...")
+            logger.info("Generated response: %.50s...", ai_message)
+            await self.response_cache.set(cache_key, ai_message)
             return ai_message
         
         except Exception as e:
-            logger.error(f"Error generating OpenAI response: {str(e)}")
+            logger.error("Error generating OpenAI response: %s", e)
             # Fallback response
             return "I'm sorry, I'm having trouble processing that right now. Could you try again?"
+    
+    async def summarize(self, summary: str, new_messages: List[Dict[str, str]]) -> Optional[str]:
+        """
+        Fold older messages into a running conversation summary
+        
+        Args:
+            summary: Previous summary ('' if none yet)
+            new_messages: Messages to merge into it
+        
+        Returns:
+            Updated summary, or None if the API call fails
+        """
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in new_messages)
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": f"Previous summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"}
+                ],
+                max_tokens=SUMMARY_MAX_TOKENS,
+                temperature=0.3
+            )
+            return response.choices[0].message.content.strip()
+        
+        except Exception as e:
+            logger.error("Error summarizing conversation: %s", e)
+            return None
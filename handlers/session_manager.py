@@ -3,25 +3,157 @@ Session Manager
 Handles user conversation sessions and context
 """
 
+import asyncio
+import heapq
 import logging
-from typing import Dict, List
-from collections import defaultdict
-from datetime import datetime, timedelta
+import sys
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+from collections import OrderedDict, deque
+from itertools import islice
+
+try:
+    import zstandard
+except ImportError:  # Compression is optional; long messages are stored as-is
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
+# Role names are interned so every stored message shares one string object per
+# role, and callers passing literals hit the identity fast path in add_message.
+_ROLE_USER = sys.intern("user")
+_ROLE_ASSISTANT = sys.intern("assistant")
+_ROLES = {_ROLE_USER: _ROLE_USER, _ROLE_ASSISTANT: _ROLE_ASSISTANT}
+
+
+# Long message bodies are kept zstd-compressed (as bytes) when zstandard is installed
+COMPRESS_MIN_CHARS = 512
+_ZSTD_C = zstandard.ZstdCompressor(level=1) if zstandard is not None else None
+_ZSTD_D = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+
+class Msg(NamedTuple):
+    """Stored message: tuple-sized, with attribute access (OpenAI dicts are built in get_context)"""
+    role: str
+    content: Union[str, bytes]  # bytes means zstd-compressed UTF-8
+    ts: float
+    
+    @property
+    def text(self) -> str:
+        """Message content, decompressed if needed"""
+        content = self.content
+        if isinstance(content, str):
+            return content
+        return _ZSTD_D.decompress(content).decode()
+
+
+def _pack_content(content: str) -> Union[str, bytes]:
+    """Compress long content when it actually saves space"""
+    if _ZSTD_C is None or len(content) <= COMPRESS_MIN_CHARS:
+        return content
+    raw = content.encode()
+    packed = _ZSTD_C.compress(raw)
+    return packed if len(packed) < len(raw) else content
+
+
+# Expired sessions are swept every N writes or every T seconds, whichever comes first
+SWEEP_EVERY_WRITES = 256
+SWEEP_INTERVAL_SECONDS = 60.0
+
+# Persisted writes are flushed in batches of up to N messages or every T seconds
+FLUSH_MAX_BATCH = 128
+FLUSH_INTERVAL_SECONDS = 0.05
+# Batches written to the store concurrently while the next one is collected
+FLUSH_MAX_CONCURRENT_WRITES = 16
+
+# Hard cap on sessions held in memory; least recently used users are evicted first
+MAX_USERS = 100_000
+
+# Messages returned verbatim by get_context by default
+CONTEXT_MESSAGES = 10
+
+# Messages that leave the context window are folded into a running summary
+# once this many have accumulated for a user (until then they stay in the context)
+SUMMARY_EVERY_EVICTIONS = 10
+# At most this many of those not-yet-summarized messages (the most recent) are added
+# to the context, so a prompt carries at most the summary plus
+# CONTEXT_MESSAGES + UNSUMMARIZED_CONTEXT_MAX history messages; older ones wait for the summary
+UNSUMMARIZED_CONTEXT_MAX = 4
+
 
 class SessionManager:
-    def __init__(self, session_timeout_minutes: int = 30):
+    def __init__(
+        self,
+        session_timeout_minutes: int = 30,
+        max_messages: int = 20,
+        max_users: int = MAX_USERS,
+        context_messages: int = CONTEXT_MESSAGES,
+        store: Optional[Any] = None,
+        summarizer: Optional[Callable[[str, List[Dict[str, str]]], Awaitable[str]]] = None
+    ):
         """
         Initialize session manager
         
         Args:
             session_timeout_minutes: Time before session expires
+            max_messages: Messages kept per user (older ones are dropped)
+            max_users: Sessions kept before evicting the least recently used user
+            context_messages: Recent messages get_context returns verbatim by default
+            store: Optional backing store with an async write_messages(rows) method;
+                rows are (user_id, role, content, timestamp) tuples
+            summarizer: Optional async callable (previous_summary, messages) -> new summary,
+                used to keep older history once it leaves the recent window
         """
-        self.sessions: Dict[str, List[Dict]] = defaultdict(list)
-        self.last_activity: Dict[str, datetime] = {}
-        self.session_timeout = timedelta(minutes=session_timeout_minutes)
+        # Bounded deques drop the oldest message in O(1) once full
+        # Kept in LRU order; only add_message creates sessions, so reads never allocate one
+        self.sessions: "OrderedDict[str, Deque[Msg]]" = OrderedDict()
+        self.max_messages = max_messages
+        self.max_users = max_users
+        self.context_messages = context_messages
+        # Monotonic seconds of each user's last message
+        self.last_activity: Dict[str, float] = {}
+        # Session timeout in seconds, compared against monotonic timestamps
+        self._timeout_s = session_timeout_minutes * 60.0
+        self._writes_since_sweep = 0
+        self._last_sweep = time.monotonic()
+        # Sessions ever started; a user returning after expiry or eviction starts a
+        # new one (tracking every distinct ID would grow without bound)
+        self._total_ever = 0
+        # (expiry time, user_id) min-heap with at most one entry per user; an entry
+        # found early (user active since) is pushed back with the current expiry
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self._in_heap: Set[str] = set()
+        # Writes to the backing store are queued and flushed in the background
+        self.store = store
+        self._write_q: Optional[asyncio.Queue] = asyncio.Queue() if store is not None else None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._write_sem = asyncio.Semaphore(FLUSH_MAX_CONCURRENT_WRITES)
+        self._write_tasks: Set[asyncio.Task] = set()
+        # Running summary of history older than the context window, messages that
+        # left the window but are not summarized yet, and the batch being summarized
+        self.summarizer = summarizer
+        self._summary: Dict[str, str] = {}
+        self._l2_pending: Dict[str, List[Msg]] = {}
+        self._summarizing: Dict[str, List[Msg]] = {}
+        self._summary_tasks: Set[asyncio.Task] = set()
+        # Last get_context result per user as (max_messages, context); dropped on any change
+        self._ctx_cache: Dict[str, Tuple[int, List[Dict[str, str]]]] = {}
+    
+    def start(self):
+        """Start the background flush task (no-op without a backing store)"""
+        if self._write_q is not None and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+    
+    async def close(self):
+        """Stop the flush task once everything queued has been written"""
+        if self._flush_task is not None:
+            # Sentinel: the loop flushes what it has collected and exits
+            self._write_q.put_nowait(None)
+            await self._flush_task
+            self._flush_task = None
+        
+        if self._write_tasks:
+            await asyncio.gather(*self._write_tasks, return_exceptions=True)
     
     def add_message(self, user_id: str, role: str, content: str):
         """
@@ -32,70 +164,259 @@ class SessionManager:
             role: 'user' or 'assistant'
             content: Message content
         """
-        # Clean old sessions
-        self._cleanup_old_sessions()
+        # Clean old sessions (amortized instead of on every write)
+        self._writes_since_sweep += 1
+        if (self._writes_since_sweep >= SWEEP_EVERY_WRITES
+                or time.monotonic() - self._last_sweep > SWEEP_INTERVAL_SECONDS):
+            self._cleanup_old_sessions()
         
-        # Add message
-        message = {
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        }
+        # Canonicalize to the interned role string
+        if role is not _ROLE_USER and role is not _ROLE_ASSISTANT:
+            canonical = _ROLES.get(role)
+            if canonical is None:
+                raise ValueError(f"Unsupported message role: {role}")
+            role = canonical
         
-        self.sessions[user_id].append(message)
-        self.last_activity[user_id] = datetime.now()
+        now = time.monotonic()
+        if user_id not in self.last_activity:
+            # New session (first contact, or back after expiry/eviction)
+            self._total_ever += 1
+        # Add message (epoch timestamp)
+        timestamp = time.time()
+        messages = self.sessions.get(user_id)
+        if messages is None:
+            messages = self.sessions[user_id] = deque(maxlen=self.max_messages)
+            if len(self.sessions) > self.max_users:
+                self._evict_lru()
+        else:
+            self.sessions.move_to_end(user_id)
+        # The message this append pushes out of the context window moves to the summary queue
+        if self.summarizer is not None and len(messages) >= self.context_messages:
+            self._evict_to_summary(user_id, messages[len(messages) - self.context_messages])
+        messages.append(Msg(role, _pack_content(content), timestamp))
+        self._ctx_cache.pop(user_id, None)
+        self.last_activity[user_id] = now
+        if user_id not in self._in_heap:
+            self._in_heap.add(user_id)
+            heapq.heappush(self._expiry_heap, (now + self._timeout_s, user_id))
         
-        # Keep only last 20 messages per user to save memory
-        if len(self.sessions[user_id]) > 20:
-            self.sessions[user_id] = self.sessions[user_id][-20:]
+        # Persistence happens off the request path in _flush_loop
+        if self._write_q is not None:
+            self._write_q.put_nowait((user_id, role, content, timestamp))
         
-        logger.debug(f"Added message for user {user_id}: {role}")
+        logger.debug("Added message for user %s: %s", user_id, role)
     
-    def get_context(self, user_id: str, max_messages: int = 10) -> List[Dict[str, str]]:
+    def get_context(self, user_id: str, max_messages: Optional[int] = None) -> List[Dict[str, str]]:
         """
         Get conversation context for a user
         
         Args:
             user_id: Instagram user ID
-            max_messages: Maximum number of messages to return
+            max_messages: Recent messages to return (defaults to context_messages);
+                up to UNSUMMARIZED_CONTEXT_MAX older ones not yet summarized go ahead of them
         
         Returns:
-            List of recent messages (for OpenAI context)
+            List of recent messages (for OpenAI context); repeated calls between
+            writes return the same list, so callers must not mutate it
         """
-        messages = self.sessions.get(user_id, [])
+        if max_messages is None:
+            max_messages = self.context_messages
+        cached = self._ctx_cache.get(user_id)
+        if cached is not None and cached[0] == max_messages:
+            self.sessions.move_to_end(user_id)
+            return cached[1]
+        
+        messages = self.sessions.get(user_id)
+        if not messages:
+            return []
+        self.sessions.move_to_end(user_id)
         
         # Return only role and content (remove timestamp)
-        return [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in messages[-max_messages:]
-        ]
+        start = max(0, len(messages) - max_messages)
+        window = list(islice(messages, start, None))
+        
+        # The most recent messages that left the window but aren't in the summary yet
+        # go verbatim (capped to keep prompts small)
+        unsummarized = self._summarizing.get(user_id, []) + self._l2_pending.get(user_id, [])
+        if unsummarized:
+            in_window = set(map(id, window))
+            older = [m for m in unsummarized if id(m) not in in_window]
+            window[0:0] = older[-UNSUMMARIZED_CONTEXT_MAX:]
+        
+        context = [{"role": m.role, "content": m.text} for m in window]
+        
+        # Older history travels as a single summary message ahead of the window
+        summary = self._summary.get(user_id)
+        if summary:
+            context.insert(0, {"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+        
+        self._ctx_cache[user_id] = (max_messages, context)
+        return context
     
     def clear_session(self, user_id: str):
         """Clear a user's session"""
-        if user_id in self.sessions:
-            del self.sessions[user_id]
-        if user_id in self.last_activity:
-            del self.last_activity[user_id]
+        self._drop_session(user_id)
+        logger.info("Cleared session for user %s", user_id)
+    
+    def clear_sessions_batch(self, user_ids: Iterable[str]) -> int:
+        """
+        Clear several sessions with a single summary log line
         
-        logger.info(f"Cleared session for user {user_id}")
+        Returns:
+            Number of sessions cleared
+        """
+        count = 0
+        for user_id in user_ids:
+            self._drop_session(user_id)
+            count += 1
+        
+        if count:
+            logger.info("Cleared %d sessions", count)
+        return count
+    
+    def _evict_lru(self):
+        """Drop the least recently used session to stay under max_users"""
+        user_id = next(iter(self.sessions))
+        self._drop_session(user_id)
+        logger.debug("Evicted least recently used session for user %s", user_id)
+    
+    def _drop_session(self, user_id: str):
+        """Remove all state held for a user (one lookup per map)"""
+        self.sessions.pop(user_id, None)
+        self.last_activity.pop(user_id, None)
+        self._summary.pop(user_id, None)
+        self._l2_pending.pop(user_id, None)
+        self._summarizing.pop(user_id, None)
+        self._ctx_cache.pop(user_id, None)
+    
+    def _evict_to_summary(self, user_id: str, message: Msg):
+        """Queue a message leaving the context window; summarize once enough have built up"""
+        self._l2_pending.setdefault(user_id, []).append(message)
+        self._maybe_summarize(user_id)
+    
+    def _maybe_summarize(self, user_id: str):
+        """Start a summarization round if enough evictions are pending"""
+        # One round per user at a time; evictions meanwhile wait for the next round
+        pending = self._l2_pending.get(user_id)
+        if pending and len(pending) >= SUMMARY_EVERY_EVICTIONS and user_id not in self._summarizing:
+            del self._l2_pending[user_id]
+            self._summarizing[user_id] = pending
+            task = asyncio.create_task(self._summarize(user_id, pending))
+            self._summary_tasks.add(task)
+            task.add_done_callback(self._summary_tasks.discard)
+    
+    async def _summarize(self, user_id: str, pending: List[Msg]):
+        """Fold evicted messages into the user's running summary"""
+        summary = None
+        try:
+            messages = [{"role": m.role, "content": m.text} for m in pending]
+            summary = await self.summarizer(self._summary.get(user_id, ""), messages)
+        except Exception as e:
+            logger.error("Error summarizing session for user %s: %s", user_id, e)
+        
+        # Drop the result if the session was cleared (or restarted) meanwhile
+        if self._summarizing.get(user_id) is not pending:
+            return
+        del self._summarizing[user_id]
+        self._ctx_cache.pop(user_id, None)
+        
+        if not summary:
+            # Keep the batch in the context and retry on a later eviction,
+            # holding at most one deque's worth so a long outage stays bounded
+            retry = pending + self._l2_pending.get(user_id, [])
+            self._l2_pending[user_id] = retry[-self.max_messages:]
+            return
+        
+        self._summary[user_id] = summary
+        logger.debug("Updated summary for user %s", user_id)
+        
+        # Catch up on evictions that piled up during this round
+        self._maybe_summarize(user_id)
     
     def _cleanup_old_sessions(self):
         """Remove expired sessions to free memory"""
-        now = datetime.now()
-        expired_users = [
-            user_id for user_id, last_time in self.last_activity.items()
-            if now - last_time > self.session_timeout
-        ]
+        now = time.monotonic()
+        self._writes_since_sweep = 0
+        self._last_sweep = now
+        
+        # Pop only entries whose expiry has passed: O(k log N) for k due entries
+        timeout_seconds = self._timeout_s
+        heap = self._expiry_heap
+        expired: List[str] = []
+        while heap and heap[0][0] < now:
+            _, user_id = heapq.heappop(heap)
+            
+            last_time = self.last_activity.get(user_id)
+            if last_time is None:
+                # Session already cleared or evicted
+                self._in_heap.discard(user_id)
+            elif now - last_time > timeout_seconds:
+                self._in_heap.discard(user_id)
+                expired.append(user_id)
+            else:
+                # Active again since this entry was pushed: requeue at the real expiry
+                heapq.heappush(heap, (last_time + timeout_seconds, user_id))
         
-        for user_id in expired_users:
-            self.clear_session(user_id)
-            logger.info(f"Expired session for user {user_id}")
+        if not expired:
+            return
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Expiring sessions for users: %s", ", ".join(expired))
+        self.clear_sessions_batch(expired)
+    
+    async def _flush_loop(self):
+        """Drain the write queue, batching up to FLUSH_MAX_BATCH messages per store call"""
+        queue = self._write_q
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            item = await queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + FLUSH_INTERVAL_SECONDS
+            
+            # Keep collecting until the batch is full or the flush window closes
+            while len(batch) < FLUSH_MAX_BATCH:
+                if not queue.empty():
+                    item = queue.get_nowait()
+                else:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            
+            # Hand the batch off so a slow store doesn't stall collection of the next one
+            await self._write_sem.acquire()
+            task = asyncio.create_task(self._write_batch(batch))
+            self._write_tasks.add(task)
+            task.add_done_callback(self._write_done)
+    
+    def _write_done(self, task: asyncio.Task):
+        """Release the write slot held by a finished batch"""
+        self._write_tasks.discard(task)
+        self._write_sem.release()
+    
+    async def _write_batch(self, batch: List[Tuple[str, str, str, float]]):
+        """Write one batch to the backing store; failures are logged, not raised"""
+        try:
+            await self.store.write_messages(batch)
+        except Exception as e:
+            logger.error("Error persisting %d session messages: %s", len(batch), e)
     
     def get_active_count(self) -> int:
         """Get number of active sessions"""
+        # Sweep first so an idle server doesn't keep counting expired sessions;
+        # with nothing due this is a single heap peek
         self._cleanup_old_sessions()
         return len(self.sessions)
     
     def get_total_count(self) -> int:
-        """Get total number of conversations ever handled"""
-        return len(self.sessions) + len(self.last_activity)
+        """Get total number of sessions ever started (returning users count again after expiry)"""
+        return self._total_ever
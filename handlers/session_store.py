@@ -0,0 +1,89 @@
+"""
+Session Store
+Durable backing store for conversation history (fed by SessionManager's flush loop)
+"""
+
+import asyncio
+import logging
+import os
+from typing import List, Optional, Tuple
+
+try:
+    import asyncpg
+except ImportError:  # Persistence is optional; sessions stay in memory only
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+# Concurrent pooled connections used for batched writes
+STORE_POOL_MAX_SIZE = 16
+
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS session_messages (
+    id BIGSERIAL PRIMARY KEY,
+    uid TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    ts DOUBLE PRECISION NOT NULL
+)
+"""
+_INSERT_MESSAGE = "INSERT INTO session_messages (uid, role, content, ts) VALUES ($1, $2, $3, $4)"
+
+
+class PostgresSessionStore:
+    def __init__(self, dsn: str):
+        """
+        Postgres-backed message log
+
+        Args:
+            dsn: Postgres connection URL
+        """
+        self.dsn = dsn
+        self._pool = None
+        # Concurrent first writes must not each build a pool (or race CREATE TABLE)
+        self._pool_lock = asyncio.Lock()
+
+    async def _get_pool(self):
+        """Create the connection pool (and table) on first use"""
+        if self._pool is not None:
+            return self._pool
+
+        async with self._pool_lock:
+            if self._pool is None:
+                pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=STORE_POOL_MAX_SIZE)
+                try:
+                    async with pool.acquire() as conn:
+                        await conn.execute(_CREATE_TABLE)
+                except Exception:
+                    await pool.close()
+                    raise
+                self._pool = pool
+        return self._pool
+
+    async def write_messages(self, rows: List[Tuple[str, str, str, float]]):
+        """Insert a batch of (uid, role, content, ts) rows in one round trip"""
+        pool = await self._get_pool()
+        async with pool.acquire() as conn:
+            await conn.executemany(_INSERT_MESSAGE, rows)
+
+    async def close(self):
+        """Close pooled connections"""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+def create_session_store() -> Optional[PostgresSessionStore]:
+    """
+    Build the session store
+    Uses Postgres when DATABASE_URL is set, otherwise returns None (in-memory only)
+    """
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        return None
+
+    if asyncpg is None:
+        logger.warning("DATABASE_URL is set but asyncpg is not installed; sessions will not be persisted")
+        return None
+
+    return PostgresSessionStore(database_url)
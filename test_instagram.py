@@ -1,83 +1,101 @@
 import asyncio
+import sys
 import aiohttp
-import json
+import orjson
+from typing import List, Tuple
 
-async def test_instagram_api():
-    """Test Instagram Graph API credentials"""
-    
-    # Load config
-    with open('config.json', 'r') as f:
-        config = json.load(f)
+from config_loader import load_config_file, mask_token
+from handlers.instagram_handler import create_graph_session
+
+async def fetch_page(session: aiohttp.ClientSession, page_id: str, api_version: str, access_token: str) -> Tuple[int, dict]:
+    """Fetch Facebook page info, including the linked Instagram account"""
+    url = f'https://graph.facebook.com/{api_version}/{page_id}'
+    params = {
+        'fields': 'id,name,followers_count,instagram_business_account',
+        'access_token': access_token
+    }
     
-    access_token = config['instagram']['access_token']
-    page_id = config['instagram']['page_id']
-    api_version = config['instagram']['api_version']
+    async with session.get(url, params=params) as resp:
+        return resp.status, await resp.json(loads=orjson.loads)
+
+async def fetch_ig(session: aiohttp.ClientSession, ig_account_id: str, api_version: str, access_token: str) -> Tuple[int, dict]:
+    """Fetch Instagram Business Account info"""
+    url = f'https://graph.facebook.com/{api_version}/{ig_account_id}'
+    params = {
+        'fields': 'id,username,name,profile_picture_url,followers_count',
+        'access_token': access_token
+    }
     
-    print("=" * 60)
-    print("Testing Instagram Graph API")
-    print("=" * 60)
-    print(f"Page ID: {page_id}")
-    print(f"API Version: {api_version}")
-    print(f"Access Token: {access_token[:20]}...{access_token[-20:]}")
-    print()
+    async with session.get(url, params=params) as resp:
+        return resp.status, await resp.json(loads=orjson.loads)
+
+async def test_instagram_api():
+    """Test Instagram Graph API credentials"""
     
-    async with aiohttp.ClientSession() as session:
-        # Test 1: Get page info
-        print("Test 1: Fetching page information...")
-        url = f'https://graph.facebook.com/{api_version}/{page_id}'
-        params = {
-            'fields': 'id,name,followers_count,instagram_business_account',
-            'access_token': access_token
-        }
+    lines: List[str] = []
+    try:
+        # Load config
+        config = load_config_file()
         
-        async with session.get(url, params=params) as resp:
-            print(f"Status Code: {resp.status}")
-            result = await resp.json()
+        access_token = config['instagram']['access_token']
+        page_id = config['instagram']['page_id']
+        api_version = config['instagram']['api_version']
+        
+        lines.extend((
+            "=" * 60,
+            "Testing Instagram Graph API",
+            "=" * 60,
+            f"Page ID: {page_id}",
+            f"API Version: {api_version}",
+            f"Access Token: {mask_token(access_token)}",
+            ""
+        ))
+        
+        async with create_graph_session() as session:
+            # Test 1: Get page info
+            lines.append("Test 1: Fetching page information...")
+            status, result = await fetch_page(session, page_id, api_version, access_token)
+            lines.append(f"Status Code: {status}")
             
-            if resp.status == 200:
-                print("✅ SUCCESS - Page info retrieved:")
-                print(f"   Page ID: {result.get('id')}")
-                print(f"   Page Name: {result.get('name', 'N/A')}")
-                print(f"   Followers: {result.get('followers_count', 'N/A')}")
+            if status == 200:
+                lines.append("✅ SUCCESS - Page info retrieved:")
+                lines.append(f"   Page ID: {result.get('id')}")
+                lines.append(f"   Page Name: {result.get('name', 'N/A')}")
+                lines.append(f"   Followers: {result.get('followers_count', 'N/A')}")
                 if 'instagram_business_account' in result:
-                    print(f"   Instagram Business Account: {result['instagram_business_account']['id']}")
+                    lines.append(f"   Instagram Business Account: {result['instagram_business_account']['id']}")
                     ig_account_id = result['instagram_business_account']['id']
                 else:
-                    print("   No Instagram Business Account linked")
+                    lines.append("   No Instagram Business Account linked")
                     ig_account_id = None
             else:
-                print(f"❌ FAILED - Error:")
-                print(json.dumps(result, indent=2))
+                lines.append(f"❌ FAILED - Error:")
+                lines.append(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
                 return
-        
-        print()
-        
-        # Test 2: Get Instagram account info (if available)
-        if ig_account_id:
-            print("Test 2: Fetching Instagram Business Account info...")
-            url = f'https://graph.facebook.com/{api_version}/{ig_account_id}'
-            params = {
-                'fields': 'id,username,name,profile_picture_url,followers_count',
-                'access_token': access_token
-            }
             
-            async with session.get(url, params=params) as resp:
-                print(f"Status Code: {resp.status}")
-                result = await resp.json()
+            lines.append("")
+            
+            # Test 2: Get Instagram account info (if available); reuses the pooled connection
+            if ig_account_id:
+                lines.append("Test 2: Fetching Instagram Business Account info...")
+                status, result = await fetch_ig(session, ig_account_id, api_version, access_token)
+                lines.append(f"Status Code: {status}")
                 
-                if resp.status == 200:
-                    print("✅ SUCCESS - Instagram account info:")
-                    print(f"   Username: @{result.get('username', 'N/A')}")
-                    print(f"   Name: {result.get('name', 'N/A')}")
-                    print(f"   Followers: {result.get('followers_count', 'N/A')}")
+                if status == 200:
+                    lines.append("✅ SUCCESS - Instagram account info:")
+                    lines.append(f"   Username: @{result.get('username', 'N/A')}")
+                    lines.append(f"   Name: {result.get('name', 'N/A')}")
+                    lines.append(f"   Followers: {result.get('followers_count', 'N/A')}")
                 else:
-                    print(f"❌ FAILED - Error:")
-                    print(json.dumps(result, indent=2))
-    
-    print()
-    print("=" * 60)
-    print("Test Complete")
-    print("=" * 60)
+                    lines.append(f"❌ FAILED - Error:")
+                    lines.append(orjson.dumps(result, option=orjson.OPT_INDENT_2).decode())
+        
+        lines.append("")
+        lines.append("=" * 60)
+        lines.append("Test Complete")
+        lines.append("=" * 60)
+    finally:
+        sys.stdout.write("\n".join(lines) + "\n")
 
 if __name__ == "__main__":
     asyncio.run(test_instagram_api())